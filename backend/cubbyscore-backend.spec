@@ -34,7 +34,8 @@ hidden_imports = [
     'music21.meter',
     'music21.tempo',
     # PDF processing
-    'pdf2image',
+    'pypdfium2',
+    'pypdfium2_raw',
     'PIL',
     'PIL.Image',
     # XML processing
@@ -42,6 +43,7 @@ hidden_imports = [
     'lxml.etree',
     # Misc
     'certifi',
+    'aiofiles',
     'multipart',
     'python_multipart',
     # homr OMR engine
@@ -6,12 +6,14 @@ import os
 os.environ["PYTORCH_JIT"] = "0"
 
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+from typing import Any, Optional
 from enum import Enum
 import os
-import subprocess
+import asyncio
+import concurrent.futures
+import threading
 from pathlib import Path
 import tempfile
 import shutil
@@ -20,11 +22,36 @@ import logging
 import glob
 import json
 import zipfile
+import hashlib
+import uuid
+import aiofiles
+from contextlib import asynccontextmanager, contextmanager
+from lxml import etree
+from pydantic import BaseModel
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# music21 is slow to import - load it once per process rather than per request.
+# Optional so the app still starts without it; only multi-page homr needs it.
+try:
+    from music21 import converter as music21_converter, stream as music21_stream
+except ImportError:
+    music21_converter = music21_stream = None
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# pypdfium2 must not be called from several threads at once
+_pdfium_lock = threading.Lock()
+
+# Set once homr has loaded its models in this process (see run_homr_on_image)
+_homr_load_lock = threading.Lock()
+_homr_loaded = threading.Event()
+
 # Audiveris path - from environment or default macOS location
 AUDIVERIS_PATH = os.environ.get("AUDIVERIS_PATH", "/Applications/Audiveris.app/Contents/MacOS/Audiveris")
 
@@ -34,7 +61,335 @@ class OMREngine(str, Enum):
     HOMR = "homr"
 
 
-app = FastAPI(title="PDF to MusicXML Converter API")
+class ConversionResult(BaseModel):
+    """Response body of /convert - declared so FastAPI (0.130+) has pydantic dump it straight to JSON bytes."""
+    success: bool
+    filename: str
+    download_url: str
+    validation: dict[str, Any]
+    engine: str
+
+
+class ValidationCache:
+    """
+    Validation reports keyed by the SHA1 of the MusicXML they describe.
+    Identical outputs (re-uploads, retries) skip parsing entirely.
+    Persisted as JSON lines so hits survive restarts: each put appends one
+    line, and once the file holds twice max_entries lines it is rewritten
+    with just the newest max_entries. Each uvicorn worker keeps its own
+    in-memory copy, so entries from other workers are seen after a restart.
+    """
+
+    def __init__(self, path: Path, max_entries: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = asyncio.Lock()
+        self._entries, self._lines = self._load()
+
+    def _load(self) -> tuple:
+        """Read the file, returning (newest max_entries entries, line count)."""
+        entries = {}
+        lines = 0
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        record = json.loads(line)
+                        key, report = record["key"], record["report"]
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn last line after a crash
+                    # Re-insert so insertion order stays oldest-first
+                    entries.pop(key, None)
+                    entries[key] = report
+        except OSError:
+            pass
+        for key in list(entries)[:-self.max_entries]:
+            del entries[key]
+        return entries, lines
+
+    @staticmethod
+    def _record(key: str, report: dict) -> str:
+        return json.dumps({"key": key, "report": report}) + "\n"
+
+    @contextmanager
+    def _file_lock(self):
+        """
+        Serialise appends and compaction across uvicorn worker processes.
+        Without fcntl (Windows, where the desktop app runs a single worker)
+        a compaction can drop lines another process appends meanwhile.
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(self.path.with_suffix(".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _append(self, key: str, report: dict):
+        with self._file_lock():
+            with open(self.path, "a") as f:
+                f.write(self._record(key, report))
+            self._lines += 1
+            if self._lines > 2 * self.max_entries:
+                self._compact()
+
+    def _compact(self):
+        # Re-read rather than dump _entries, so lines appended by other
+        # worker processes survive. Write to a temp file and rename so
+        # readers never see a partial file; the temp name is per process.
+        entries, _ = self._load()
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            f.writelines(self._record(key, report) for key, report in entries.items())
+        os.replace(tmp_path, self.path)
+        self._lines = len(entries)
+
+    @staticmethod
+    def hash_file(path: Path) -> str:
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as f:
+            while chunk := f.read(UPLOAD_CHUNK_SIZE):
+                sha1.update(chunk)
+        return sha1.hexdigest()
+
+    def get(self, key: str, processing_time: float) -> Optional[dict]:
+        report = self._entries.get(key)
+        if report is None:
+            return None
+        return {**report, "processingTime": round(processing_time, 2)}
+
+    async def put(self, key: str, report: dict):
+        # Don't cache failures - the next attempt may succeed
+        if "error" in report:
+            return
+        async with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = report
+            if len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+            try:
+                await asyncio.to_thread(self._append, key, report)
+            except OSError as e:
+                logger.warning(f"Could not persist validation report: {e}")
+
+
+class AudiverisWorker:
+    """
+    Long-lived dispatcher for Audiveris jobs.
+    Audiveris only runs as a batch CLI, so rather than starting a JVM per
+    request, up to max_concurrent runs go at once and PDFs queued while every
+    run is busy are coalesced into the next invocation - one JVM start serves
+    every PDF in the batch. Audiveris works through a batch one PDF at a time
+    and each request waits for the whole run, so batches are kept small.
+    Audiveris names its outputs after each PDF's stem, so PDFs whose outputs
+    couldn't be told apart ("score" and "score.v2") never share a run.
+    """
+
+    timeout_per_pdf = 300  # seconds
+
+    def __init__(self, max_batch: int = 4, max_concurrent: int = 1):
+        self.max_batch = max_batch
+        self.max_concurrent = max_concurrent
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batches = set()  # running batch tasks, kept alive until they finish
+        self._deferred = []  # jobs held out of a batch by a stem clash, run next
+
+    def ensure_running(self):
+        """Start the dispatcher, or restart it if it has died."""
+        if self._task is not None and not self._task.done():
+            return
+        if self._task is not None and not self._task.cancelled() and self._task.exception():
+            logger.error(f"Audiveris worker died, restarting: {self._task.exception()}")
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+            self._deferred = []
+            self._loop = loop
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, pdf_path: Path, output_dir: Path):
+        """Queue a PDF and wait until Audiveris has written its output to output_dir."""
+        self.ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((pdf_path, output_dir, future))
+        await future
+
+    async def _run(self):
+        while True:
+            jobs = [self._deferred.pop(0) if self._deferred else await self._queue.get()]
+            await self._slots.acquire()
+            # Spare slots mean spare JVMs - only batch up the backlog that
+            # builds while every slot is busy
+            if self._slots.locked():
+                held, self._deferred = self._deferred, []
+                while len(jobs) < self.max_batch and (held or not self._queue.empty()):
+                    job = held.pop(0) if held else self._queue.get_nowait()
+                    if any(self._stems_clash(job[0].stem, other[0].stem) for other in jobs):
+                        self._deferred.append(job)
+                    else:
+                        jobs.append(job)
+                self._deferred.extend(held)
+            self._spawn(self._run_in_slot(jobs))
+
+    @staticmethod
+    def _stems_clash(a: str, b: str) -> bool:
+        """Whether Audiveris outputs for PDFs with stems a and b could share a name."""
+        return a == b or a.startswith(f"{b}.") or b.startswith(f"{a}.")
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _run_in_slot(self, jobs: list):
+        """Run a batch in a slot already acquired by _run."""
+        try:
+            unfinished = await self._run_batch(jobs)
+        except Exception as e:
+            unfinished = []
+            for _, _, future in jobs:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+        # A PDF that hangs or breaks Audiveris takes the rest of its batch
+        # down with it - give each unfinished PDF a run of its own
+        for job in unfinished:
+            self._spawn(self._run_alone(job))
+
+    async def _run_alone(self, job: tuple):
+        async with self._slots:
+            try:
+                await self._run_batch([job])
+            except Exception as e:
+                if not job[2].done():
+                    job[2].set_exception(e)
+
+    async def _run_batch(self, jobs: list) -> list:
+        """
+        Run Audiveris once over jobs and resolve their futures.
+        Returns the jobs left without output by a failed multi-PDF run.
+        """
+        batch_dir = Path(tempfile.mkdtemp(prefix="audiveris_", dir=UPLOAD_DIR))
+        input_dir = batch_dir / "input"
+        export_dir = batch_dir / "export"
+        input_dir.mkdir()
+        export_dir.mkdir()
+
+        try:
+            # Link each PDF in under its own name - Audiveris titles the score
+            # after it - in a directory of its own, so the link survives the
+            # request's cleanup and equal names can't overwrite each other
+            linked = []
+            for job in jobs:
+                pdf_path, _, future = job
+                if future.done():
+                    continue  # request cancelled while queued
+                job_input = input_dir / uuid.uuid4().hex / pdf_path.name
+                try:
+                    job_input.parent.mkdir()
+                    link_or_copy(pdf_path, job_input)
+                except OSError as e:
+                    future.set_exception(e)
+                    continue
+                linked.append((job, job_input))
+
+            if not linked:
+                return []
+
+            # Run Audiveris in batch mode
+            cmd = [
+                AUDIVERIS_PATH,
+                "-batch",
+                "-export",
+                "-output", str(export_dir),
+                *[str(job_input) for _, job_input in linked]
+            ]
+
+            logger.debug(f"Running command: {' '.join(cmd)}")
+
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+
+            timeout = self.timeout_per_pdf * len(linked)
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                error = f"Audiveris processing timed out ({timeout} seconds)"
+            except asyncio.CancelledError:
+                proc.kill()
+                raise
+            else:
+                stdout = stdout.decode(errors="replace")
+                stderr = stderr.decode(errors="replace")
+
+                logger.debug(f"Audiveris stdout: {stdout}")
+                if stderr:
+                    logger.warning(f"Audiveris stderr: {stderr}")
+
+                error = None
+                if proc.returncode != 0:
+                    logger.error(f"Audiveris failed with return code {proc.returncode}")
+                    error = f"Audiveris processing failed: {stderr}"
+
+            unfinished = []
+            for job, job_input in linked:
+                pdf_path, output_dir, future = job
+                if future.done():
+                    continue
+                try:
+                    outputs = self._move_outputs(export_dir, job_input.stem, output_dir)
+                except OSError as e:
+                    future.set_exception(e)
+                    continue
+
+                if error is None or outputs:
+                    future.set_result(None)
+                elif len(linked) > 1:
+                    unfinished.append(job)
+                else:
+                    future.set_exception(RuntimeError(error))
+            return unfinished
+
+        finally:
+            shutil.rmtree(batch_dir, ignore_errors=True)
+
+    @staticmethod
+    def _move_outputs(export_dir: Path, stem: str, output_dir: Path) -> bool:
+        """
+        Move <stem>/ and <stem>.* into output_dir. Only unambiguous because
+        _run never puts clashing stems in one batch.
+        """
+        outputs = [f for f in export_dir.iterdir() if f.name == stem or f.name.startswith(f"{stem}.")]
+        for f in outputs:
+            shutil.move(str(f), str(output_dir / f.name))
+        return bool(outputs)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Each uvicorn worker process runs this on its own startup
+    UPLOAD_DIR.mkdir(exist_ok=True)
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    BY_HASH_DIR.mkdir(exist_ok=True)
+    CACHE_DIR.mkdir(exist_ok=True)
+    audiveris_worker.ensure_running()
+    yield
+    _val_pool.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="PDF to MusicXML Converter API", lifespan=lifespan)
 
 # CORS for your frontend
 app.add_middleware(
@@ -47,8 +402,39 @@ app.add_middleware(
 
 UPLOAD_DIR = Path("uploads")
 OUTPUT_DIR = Path("outputs")
-UPLOAD_DIR.mkdir(exist_ok=True)
-OUTPUT_DIR.mkdir(exist_ok=True)
+BY_HASH_DIR = OUTPUT_DIR / "by-hash"  # earlier conversions, keyed by upload hash, engine and name
+CACHE_DIR = Path("cache")  # server-side state, never served by /download
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MB
+PDF_RENDER_DPI = 300
+
+# MusicXML elements read by generate_validation_report, in any namespace
+_REPORT_TAGS = tuple(
+    f"{{*}}{name}"
+    for name in ("work-title", "creator", "score-part", "clef", "time", "direction", "sound", "note", "measure")
+)
+
+validation_cache = ValidationCache(CACHE_DIR / "validation_cache.jsonl")
+
+# Cap concurrent OMR work per engine - running too many Audiveris JVMs or homr
+# inferences at once thrashes CPU and RAM for everyone. Each engine has its own
+# budget, so requests queued for one never hold up the other. The caps are per
+# process: with WEB_CONCURRENCY uvicorn workers the machine-wide limit is
+# WEB_CONCURRENCY times this.
+MAX_OMR_CONCURRENCY = int(os.environ.get("MAX_OMR_CONCURRENCY", max(1, (os.cpu_count() or 1) // 2)))
+
+# Each Audiveris run is a JVM of its own
+audiveris_worker = AudiverisWorker(max_concurrent=MAX_OMR_CONCURRENCY)
+
+# Shared by every homr inference in the process, including the pages of a PDF
+_HOMR_SEM = asyncio.Semaphore(MAX_OMR_CONCURRENCY)
+
+# Threads for render_pdf_page - a pool of our own so process_pdf_with_homr can
+# tell which renders are still running when it's cancelled
+_render_pool = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count())
+
+# Report parsing is CPU-bound and holds the GIL - run it in worker processes
+_val_pool = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count())
+
 
 @app.get("/")
 async def root():
@@ -70,7 +456,7 @@ async def get_available_engines():
 async def convert_pdf_to_musicxml(
     file: UploadFile = File(...),
     engine: str = Form(default="audiveris")
-):
+) -> ConversionResult:
     """
     Convert uploaded PDF or image score to MusicXML
     Priority order: title, composer, instruments > clefs > time sigs > tempos > notes
@@ -84,8 +470,6 @@ async def convert_pdf_to_musicxml(
     - validation: Validation report with confidence scores
     - engine: Which engine was used
     """
-    import time
-
     # Check file type
     filename_lower = file.filename.lower()
     is_pdf = filename_lower.endswith('.pdf')
@@ -103,48 +487,79 @@ async def convert_pdf_to_musicxml(
         raise HTTPException(status_code=400, detail=f"Invalid engine. Choose from: {[e.value for e in OMREngine]}")
 
     # Create unique temporary directory for this conversion
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    temp_dir = UPLOAD_DIR / timestamp
-    temp_dir.mkdir(exist_ok=True)
-    start_time = time.time()
+    temp_dir = Path(tempfile.mkdtemp(prefix=f"{datetime.now():%Y%m%d_%H%M%S}_", dir=UPLOAD_DIR))
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
 
     try:
-        # Save uploaded file
+        # Save uploaded file, hashing it as it streams to disk
         file_path = temp_dir / file.filename
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # Process with selected OMR engine
-        if engine == OMREngine.HOMR.value:
-            if is_image:
-                musicxml_path = await process_image_with_homr(file_path, temp_dir)
-            else:
-                musicxml_path = await process_pdf_with_homr(file_path, temp_dir)
+        upload_hash = hashlib.sha1()
+        async with aiofiles.open(file_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                upload_hash.update(chunk)
+                await buffer.write(chunk)
+
+        # Identical uploads (e.g. retries) reuse the earlier conversion. homr
+        # writes the filename into the score title, so the name is part of the
+        # key - the same bytes uploaded by someone else mustn't get this title.
+        upload_key = hashlib.sha1(f"{upload_hash.hexdigest()}:{engine}:{file_path.stem}".encode()).hexdigest()
+        converted = load_converted_upload(upload_key)
+
+        if converted:
+            logger.info(f"Upload already converted, reusing {upload_key}")
+            enhanced_musicxml_path, validation_report = converted
+            validation_report["processingTime"] = round(loop.time() - start_time, 2)
         else:
-            musicxml_path = await process_pdf_with_audiveris(file_path, temp_dir)
-
-        # Post-process MusicXML
-        enhanced_musicxml_path = await enhance_musicxml(musicxml_path)
-
-        # Calculate processing time
-        processing_time = time.time() - start_time
-
-        # Generate validation report
-        validation_report = generate_validation_report(enhanced_musicxml_path, processing_time)
+            # Process with selected OMR engine (waits if that engine is at capacity)
+            if engine == OMREngine.HOMR.value:
+                if is_image:
+                    musicxml_path = await process_image_with_homr(file_path, temp_dir)
+                else:
+                    musicxml_path = await process_pdf_with_homr(file_path, temp_dir)
+            else:
+                musicxml_path = await process_pdf_with_audiveris(file_path, temp_dir)
+
+            # Post-process MusicXML
+            enhanced_musicxml_path = await enhance_musicxml(musicxml_path)
+
+            # Calculate processing time
+            processing_time = loop.time() - start_time
+
+            # Generate validation report (reuse a cached one for identical output)
+            musicxml_hash = await asyncio.to_thread(ValidationCache.hash_file, enhanced_musicxml_path)
+            validation_report = validation_cache.get(musicxml_hash, processing_time)
+            if validation_report is None:
+                validation_report = await loop.run_in_executor(
+                    _val_pool,
+                    generate_validation_report,
+                    str(enhanced_musicxml_path),
+                    processing_time
+                )
+                await validation_cache.put(musicxml_hash, validation_report)
+            else:
+                logger.info(f"Using cached validation report for {musicxml_hash}")
 
         # Save the final MusicXML file
         output_filename = f"{Path(file.filename).stem}.musicxml"
-        final_path = OUTPUT_DIR / f"{timestamp}_{output_filename}"
-        shutil.copy(enhanced_musicxml_path, final_path)
+        # A random prefix keeps names unique; /download strips it back off
+        output_name = f"{uuid.uuid4().hex}_{output_filename}"
+        final_path = OUTPUT_DIR / output_name
+        # Hardlink rather than copy - the temp dir cleanup below only drops
+        # the other name, so the output survives without duplicating bytes
+        link_or_copy(enhanced_musicxml_path, final_path)
+
+        if not converted:
+            store_converted_upload(upload_key, final_path, validation_report)
 
         # Return JSON with validation report and download URL
-        return JSONResponse(content={
-            "success": True,
-            "filename": output_filename,
-            "download_url": f"/download/{timestamp}_{output_filename}",
-            "validation": validation_report,
-            "engine": engine
-        })
+        return ConversionResult(
+            success=True,
+            filename=output_filename,
+            download_url=f"/download/{output_name}",
+            validation=validation_report,
+            engine=engine
+        )
 
     except Exception as e:
         logger.error(f"Conversion failed: {e}")
@@ -159,14 +574,24 @@ async def convert_pdf_to_musicxml(
 @app.get("/download/{filename}")
 async def download_file(filename: str):
     """Download a converted MusicXML file."""
+    # Only converted scores - not dotfiles, the by-hash index or anything else in OUTPUT_DIR
+    if filename.startswith(".") or os.path.basename(filename) != filename or not filename.endswith(".musicxml"):
+        raise HTTPException(status_code=404, detail="File not found")
+
     file_path = OUTPUT_DIR / filename
-    if not file_path.exists():
+    try:
+        # Stat once here and hand the result to FileResponse so it doesn't stat again
+        stat_result = os.stat(file_path)
+    except OSError:
         raise HTTPException(status_code=404, detail="File not found")
 
     return FileResponse(
         path=file_path,
+        stat_result=stat_result,
         media_type="application/vnd.recordare.musicxml+xml",
-        filename=filename.split("_", 1)[-1] if "_" in filename else filename
+        filename=filename.split("_", 1)[-1] if "_" in filename else filename,
+        # Outputs are never rewritten under the same name
+        headers={"Cache-Control": "public, max-age=3600"}
     )
 
 async def process_pdf_with_audiveris(pdf_path: Path, work_dir: Path) -> Path:
@@ -184,35 +609,8 @@ async def process_pdf_with_audiveris(pdf_path: Path, work_dir: Path) -> Path:
     if not Path(AUDIVERIS_PATH).exists():
         raise FileNotFoundError(f"Audiveris not found at {AUDIVERIS_PATH}")
 
-    # Run Audiveris in batch mode
-    cmd = [
-        AUDIVERIS_PATH,
-        "-batch",
-        "-export",
-        "-output", str(output_dir),
-        str(pdf_path)
-    ]
-
-    logger.debug(f"Running command: {' '.join(cmd)}")
-
-    try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout
-        )
-
-        logger.debug(f"Audiveris stdout: {result.stdout}")
-        if result.stderr:
-            logger.warning(f"Audiveris stderr: {result.stderr}")
-
-        if result.returncode != 0:
-            logger.error(f"Audiveris failed with return code {result.returncode}")
-            raise RuntimeError(f"Audiveris processing failed: {result.stderr}")
-
-    except subprocess.TimeoutExpired:
-        raise RuntimeError("Audiveris processing timed out (5 minutes)")
+    # Run Audiveris via the shared worker, which batches concurrent requests
+    await audiveris_worker.submit(pdf_path, output_dir)
 
     # Find the generated MusicXML file
     # Audiveris creates files with pattern: <filename>/<filename>.mxl or .musicxml
@@ -226,11 +624,7 @@ async def process_pdf_with_audiveris(pdf_path: Path, work_dir: Path) -> Path:
         output_dir / f"{pdf_stem}.musicxml",
     ]
 
-    # Also search recursively
-    all_musicxml = list(output_dir.glob("**/*.mxl")) + list(output_dir.glob("**/*.musicxml"))
-
     logger.debug(f"Looking for MusicXML in: {output_dir}")
-    logger.debug(f"Found MusicXML files: {all_musicxml}")
 
     musicxml_path = None
     for pattern in musicxml_patterns:
@@ -238,8 +632,12 @@ async def process_pdf_with_audiveris(pdf_path: Path, work_dir: Path) -> Path:
             musicxml_path = pattern
             break
 
-    if not musicxml_path and all_musicxml:
-        musicxml_path = all_musicxml[0]
+    if not musicxml_path:
+        # Not at a known location - fall back to searching recursively
+        all_musicxml = list(output_dir.glob("**/*.mxl")) + list(output_dir.glob("**/*.musicxml"))
+        logger.debug(f"Found MusicXML files: {all_musicxml}")
+        if all_musicxml:
+            musicxml_path = all_musicxml[0]
 
     if not musicxml_path:
         # List all files in output directory for debugging
@@ -258,30 +656,59 @@ async def process_pdf_with_audiveris(pdf_path: Path, work_dir: Path) -> Path:
 
 def extract_mxl(mxl_path: Path, work_dir: Path) -> Path:
     """
-    Extract MusicXML from a compressed .mxl file
+    Extract MusicXML from a compressed .mxl file.
+    Only the score named by the archive's container is streamed out - the
+    rest of the archive is never written to disk.
     """
     logger.debug(f"Extracting MXL file: {mxl_path}")
-    extract_dir = work_dir / "mxl_extracted"
-    extract_dir.mkdir(exist_ok=True)
+    xml_path = work_dir / f"{mxl_path.stem}.musicxml"
 
     with zipfile.ZipFile(mxl_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_dir)
+        with zip_ref.open(mxl_rootfile(zip_ref)) as src, open(xml_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, UPLOAD_CHUNK_SIZE)
+
+    logger.debug(f"Extracted MusicXML: {xml_path}")
+    return xml_path
+
+
+def mxl_rootfile(zip_ref: zipfile.ZipFile) -> str:
+    """
+    Return the name of the score inside an .mxl archive.
+    META-INF/container.xml names it; fall back to the first other .xml entry.
+    """
+    try:
+        container = etree.fromstring(zip_ref.read("META-INF/container.xml"))
+        rootfile = container.find(".//{*}rootfile")
+        if rootfile is not None and rootfile.get("full-path"):
+            return rootfile.get("full-path")
+    except (KeyError, etree.XMLSyntaxError):
+        pass
 
-    # Find the .xml file inside (usually named the same as the mxl or 'score.xml')
-    xml_files = list(extract_dir.glob("**/*.xml"))
-    # Filter out container.xml and META-INF files
-    xml_files = [f for f in xml_files if 'META-INF' not in str(f) and f.name != 'container.xml']
+    for name in zip_ref.namelist():
+        if name.endswith(".xml") and not name.startswith("META-INF"):
+            return name
 
-    if not xml_files:
-        raise FileNotFoundError(f"No XML file found in MXL archive: {mxl_path}")
+    raise FileNotFoundError(f"No XML file found in MXL archive: {zip_ref.filename}")
 
-    logger.debug(f"Extracted MusicXML: {xml_files[0]}")
-    return xml_files[0]
+
+@contextmanager
+def open_musicxml(path: str):
+    """Open a MusicXML file for binary reading, streaming .mxl scores straight from the archive."""
+    if Path(path).suffix.lower() != ".mxl":
+        with open(path, "rb") as f:
+            yield f
+        return
+
+    with zipfile.ZipFile(path) as zip_ref:
+        with zip_ref.open(mxl_rootfile(zip_ref)) as f:
+            yield f
 
 
 def run_homr_on_image(image_path: str, output_path: str, title: str = "Score") -> Path:
     """
     Run homr OMR on a single image using the Python API.
+    Models stay loaded in-process between calls, so pages and requests
+    reuse them rather than paying a load per image.
     Returns path to generated MusicXML file.
     """
     import xml.etree.ElementTree as ET
@@ -306,8 +733,17 @@ def run_homr_on_image(image_path: str, output_path: str, title: str = "Score") -
         tempo=None
     )
 
-    # Process the image
-    staffs = process_image(image_path, config, xml_args)
+    # Process the image. homr loads its model weights on first use and keeps
+    # them for the life of the process, so the first run holds a lock until
+    # the weights are in place - concurrent pages then share them instead of
+    # each loading their own copy.
+    if _homr_loaded.is_set():
+        staffs = process_image(image_path, config, xml_args)
+    else:
+        with _homr_load_lock:
+            staffs = process_image(image_path, config, xml_args)
+            if staffs:
+                _homr_loaded.set()
 
     if not staffs:
         raise RuntimeError(f"homr did not detect any musical content in {image_path}")
@@ -325,6 +761,35 @@ def run_homr_on_image(image_path: str, output_path: str, title: str = "Score") -
     return Path(output_path)
 
 
+def render_pdf_page(pdf, index: int, img_path: Path):
+    """
+    Render a single PDF page to a PNG file at PDF_RENDER_DPI.
+    pdfium is not thread-safe, so pdfium calls are serialised with a lock.
+    Native page and bitmap buffers are freed as soon as the file is written,
+    so memory is bounded by the pages in flight rather than the page count.
+    """
+    with _pdfium_lock:
+        page = pdf[index]
+        bitmap = page.render(scale=PDF_RENDER_DPI / 72)
+        page.close()
+
+    try:
+        image = bitmap.to_pil()
+        # homr decodes the pixels straight away, so favour speed over file size
+        image.save(str(img_path), "PNG", compress_level=1, optimize=False)
+        image.close()
+    finally:
+        with _pdfium_lock:
+            bitmap.close()
+
+
+def close_pdf_when_idle(pdf, renders: list):
+    """Close pdf once the render_pdf_page futures using it have finished."""
+    concurrent.futures.wait(renders)
+    with _pdfium_lock:
+        pdf.close()
+
+
 async def process_pdf_with_homr(pdf_path: Path, work_dir: Path) -> Path:
     """
     Process PDF using homr (Python ML-based OMR engine).
@@ -336,53 +801,67 @@ async def process_pdf_with_homr(pdf_path: Path, work_dir: Path) -> Path:
     logger.info(f"Processing PDF with homr: {pdf_path}")
 
     try:
-        from pdf2image import convert_from_path
+        import pypdfium2 as pdfium
     except ImportError as e:
-        logger.error(f"pdf2image import failed: {e}")
-        raise RuntimeError("pdf2image is not installed. Please install with: pip install pdf2image")
+        logger.error(f"pypdfium2 import failed: {e}")
+        raise RuntimeError("pypdfium2 is not installed. Please install with: pip install pypdfium2")
 
     # Create output directory
     output_dir = work_dir / "homr_output"
     output_dir.mkdir(exist_ok=True)
 
+    pdf = None
+    renders = []  # render_pdf_page futures, see finally
     try:
-        # Convert PDF to images
-        logger.debug("Converting PDF to images...")
-        images = convert_from_path(str(pdf_path), dpi=300)
+        # Open the PDF - pages are rendered in-process by pdfium, no temp files
+        pdf = pdfium.PdfDocument(str(pdf_path))
+        page_count = len(pdf)
 
-        if not images:
+        if not page_count:
             raise RuntimeError("Failed to convert PDF to images")
 
-        logger.info(f"PDF has {len(images)} page(s)")
+        logger.info(f"PDF has {page_count} page(s)")
 
-        # Process each page with homr
-        musicxml_files = []
+        # Process pages concurrently - each page is independent, so run
+        # homr for several pages at once, within the process-wide homr budget.
+        # Pages are rendered inside the tasks so rendering overlaps inference.
+        loop = asyncio.get_running_loop()
 
-        for i, img in enumerate(images):
-            logger.debug(f"Processing page {i+1}/{len(images)} with homr...")
+        async def run_homr(i: int) -> Path:
+            async with _HOMR_SEM:
+                logger.debug(f"Processing page {i+1}/{page_count} with homr...")
 
-            # Save image temporarily for homr
-            img_path = output_dir / f"page_{i}.png"
-            img.save(str(img_path), "PNG")
+                # Render the page to an image file for homr
+                img_path = output_dir / f"page_{i}.png"
+                render = _render_pool.submit(render_pdf_page, pdf, i, img_path)
+                renders.append(render)
+                await asyncio.wrap_future(render)
 
-            # Output path for this page
-            page_output = output_dir / f"page_{i}.musicxml"
+                # Output path for this page
+                page_output = output_dir / f"page_{i}.musicxml"
 
-            try:
-                run_homr_on_image(
+                await loop.run_in_executor(
+                    None,
+                    run_homr_on_image,
                     str(img_path),
                     str(page_output),
-                    title=f"{pdf_path.stem} - Page {i+1}"
+                    f"{pdf_path.stem} - Page {i+1}"
                 )
-                if page_output.exists():
-                    musicxml_files.append(page_output)
-                    logger.info(f"Page {i+1} processed successfully: {page_output}")
-                else:
-                    logger.warning(f"homr did not produce output for page {i+1}")
+                return page_output
 
-            except Exception as e:
-                logger.warning(f"homr failed on page {i+1}: {e}")
-                continue
+        tasks = [run_homr(i) for i in range(page_count)]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Collect page results in page order
+        musicxml_files = []
+        for i, result in enumerate(results):
+            if isinstance(result, BaseException):
+                logger.warning(f"homr failed on page {i+1}: {result}")
+            elif result.exists():
+                musicxml_files.append(result)
+                logger.info(f"Page {i+1} processed successfully: {result}")
+            else:
+                logger.warning(f"homr did not produce output for page {i+1}")
 
         if not musicxml_files:
             raise RuntimeError("homr did not detect any musical content in the PDF")
@@ -390,17 +869,17 @@ async def process_pdf_with_homr(pdf_path: Path, work_dir: Path) -> Path:
         # If single page, just return that file
         if len(musicxml_files) == 1:
             final_path = output_dir / f"{pdf_path.stem}.musicxml"
-            shutil.copy(musicxml_files[0], final_path)
-            return final_path
+            return musicxml_files[0].replace(final_path)
 
         # For multiple pages, combine using music21
-        logger.debug("Combining multiple pages with music21...")
-        from music21 import converter, stream
+        if music21_stream is None:
+            raise RuntimeError("music21 is not installed. Please install with: pip install music21")
 
-        combined_score = stream.Score()
+        logger.debug("Combining multiple pages with music21...")
+        combined_score = music21_stream.Score()
         for mxml_file in musicxml_files:
             try:
-                page_score = converter.parse(str(mxml_file))
+                page_score = music21_converter.parse(str(mxml_file))
                 for part in page_score.parts:
                     combined_score.append(part)
             except Exception as e:
@@ -416,6 +895,17 @@ async def process_pdf_with_homr(pdf_path: Path, work_dir: Path) -> Path:
         logger.error(f"homr processing failed: {e}")
         raise RuntimeError(f"homr processing failed: {str(e)}")
 
+    finally:
+        if pdf is not None:
+            # If this request was cancelled, renders already running carry on
+            # in their threads - drop the queued ones and close the document
+            # only once the rest are done, off the event loop
+            running = [render for render in renders if not render.cancel() and not render.done()]
+            if running:
+                _render_pool.submit(close_pdf_when_idle, pdf, running)
+            else:
+                pdf.close()
+
 
 async def process_image_with_homr(img_path: Path, work_dir: Path) -> Path:
     """
@@ -432,11 +922,15 @@ async def process_image_with_homr(img_path: Path, work_dir: Path) -> Path:
     final_path = output_dir / f"{img_path.stem}.musicxml"
 
     try:
-        run_homr_on_image(
-            str(img_path),
-            str(final_path),
-            title=img_path.stem
-        )
+        # homr is CPU-bound; run it off the event loop
+        async with _HOMR_SEM:
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                run_homr_on_image,
+                str(img_path),
+                str(final_path),
+                img_path.stem
+            )
 
         if final_path.exists():
             logger.info(f"homr MusicXML generated: {final_path}")
@@ -457,34 +951,149 @@ async def enhance_musicxml(musicxml_path: Path) -> Path:
     return musicxml_path
 
 
-def generate_validation_report(musicxml_path: Path, processing_time: float) -> dict:
+def load_converted_upload(upload_key: str) -> Optional[tuple]:
     """
-    Generate a validation report by parsing the MusicXML with music21.
-    Extracts all 5 priority elements and calculates confidence scores.
+    Look up an earlier conversion of the same upload.
+    Returns (musicxml_path, validation_report), or None if not converted yet.
     """
-    import music21
-    from music21 import converter, metadata, clef, meter, tempo
+    musicxml_path = BY_HASH_DIR / f"{upload_key}.musicxml"
+    report_path = BY_HASH_DIR / f"{upload_key}.json"
+
+    try:
+        with open(report_path) as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return None
 
+    if not musicxml_path.exists():
+        return None
+
+    return musicxml_path, report
+
+
+def store_converted_upload(upload_key: str, musicxml_path: Path, report: dict):
+    """Record a successful conversion so identical uploads can skip OMR."""
+    if "error" in report:
+        return
+
+    cached_path = BY_HASH_DIR / f"{upload_key}.musicxml"
+    report_path = BY_HASH_DIR / f"{upload_key}.json"
+
+    try:
+        try:
+            link_or_copy(musicxml_path, cached_path)
+        except FileExistsError:
+            # A concurrent identical upload stored its result first - keep
+            # its file and report together rather than overwrite the report
+            return
+
+        # Report goes last - its presence marks the entry as complete
+        tmp_path = report_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(report, f)
+        os.replace(tmp_path, report_path)
+    except OSError as e:
+        logger.warning(f"Could not record conversion {upload_key}: {e}")
+
+
+def link_or_copy(src: Path, dst: Path):
+    """
+    Hardlink src to dst, falling back to a copy where linking isn't possible.
+    Never replaces an existing dst - raises FileExistsError instead.
+    """
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError:
+        with open(src, "rb") as src_file, open(dst, "xb") as dst_file:
+            shutil.copyfileobj(src_file, dst_file)
+
+
+def generate_validation_report(musicxml_path: str, processing_time: float) -> dict:
+    """
+    Generate a validation report by streaming the MusicXML with lxml.
+    Extracts all 5 priority elements and calculates confidence scores.
+    """
     logger.info(f"Generating validation report for: {musicxml_path}")
 
     try:
-        # Parse the MusicXML
-        score = converter.parse(str(musicxml_path))
+        title = None
+        composer = None
+        instruments = []
+        clef_signs = []
+        time_sigs = []
+        tempo_marks = []
+        note_count = 0
+        rest_count = 0
+
+        # Stream the score once, counting elements as they complete - no
+        # object model is built, and each measure is dropped once it's done
+        with open_musicxml(musicxml_path) as xml_file:
+            context = etree.iterparse(
+                xml_file,
+                events=("end",),
+                tag=_REPORT_TAGS,
+                resolve_entities=False
+            )
+            for _, el in context:
+                tag = el.tag.rpartition("}")[2]
+
+                if tag == "note":
+                    # Only written rests count. music21 also turned <forward> into
+                    # hidden spacer rests in Finale files, so reported higher counts
+                    if el.find("{*}rest") is not None:
+                        rest_count += 1
+                    elif el.find("{*}chord") is None:
+                        # Chord members after the first carry <chord/>; count the chord once
+                        note_count += 1
+                elif tag == "clef":
+                    clef_signs.append(el.findtext("{*}sign"))
+                elif tag == "time":
+                    beats = el.findtext("{*}beats")
+                    beat_type = el.findtext("{*}beat-type")
+                    if beats and beat_type:
+                        time_sigs.append(f"{beats}/{beat_type}")
+                elif tag == "direction":
+                    bpm = el.findtext(".//{*}metronome/{*}per-minute")
+                    sound = el.find("{*}sound")
+                    if bpm is None and sound is not None:
+                        bpm = sound.get("tempo")
+                    if bpm:
+                        tempo_marks.append((el.findtext(".//{*}words"), bpm))
+                elif tag == "sound":
+                    # <sound> inside a <direction> is read with the direction
+                    parent = el.getparent()
+                    if parent is not None and parent.tag.rpartition("}")[2] == "measure" and el.get("tempo"):
+                        tempo_marks.append((None, el.get("tempo")))
+                elif tag == "measure":
+                    # Everything collected above is inside measures - free this
+                    # one and the earlier measures it follows
+                    el.clear(keep_tail=True)
+                    while el.getprevious() is not None:
+                        del el.getparent()[0]
+                elif tag == "score-part":
+                    instruments.append(el.findtext("{*}part-name") or el.get("id"))
+                elif tag == "work-title":
+                    title = title or el.text
+                elif tag == "creator":
+                    if composer is None and el.get("type") == "composer":
+                        composer = el.text
 
         # Priority 1: Metadata (title, composer, instruments)
-        metadata_info = extract_metadata(score)
+        metadata_info = extract_metadata(title, composer, instruments)
 
         # Priority 2: Clefs
-        clefs_info = extract_clefs(score)
+        clefs_info = extract_clefs(clef_signs)
 
         # Priority 3: Time Signatures
-        time_sigs_info = extract_time_signatures(score)
+        time_sigs_info = extract_time_signatures(time_sigs)
 
         # Priority 4: Tempos
-        tempos_info = extract_tempos(score)
+        tempos_info = extract_tempos(tempo_marks)
 
         # Priority 5: Notes
-        notes_info = extract_notes(score)
+        notes_info = extract_notes(note_count, rest_count)
 
         # Calculate overall confidence
         confidences = [
@@ -524,25 +1133,12 @@ def generate_validation_report(musicxml_path: Path, processing_time: float) -> d
         }
 
 
-def extract_metadata(score) -> dict:
-    """Extract title, composer, and instrument names from the score."""
-    from music21 import metadata
-
-    title = None
-    composer = None
+def extract_metadata(title: Optional[str], composer: Optional[str], part_names: list) -> dict:
+    """Summarise title, composer, and instrument names found in the score."""
     instruments = []
 
-    # Extract metadata
-    if score.metadata:
-        title = score.metadata.title
-        if score.metadata.composers:
-            composer = score.metadata.composers[0]
-        elif hasattr(score.metadata, 'composer'):
-            composer = score.metadata.composer
-
-    # Extract instrument names from parts
-    for part in score.parts:
-        part_name = part.partName or part.id
+    # Instrument names, one per distinct part name
+    for part_name in part_names:
         if part_name and part_name not in instruments:
             instruments.append(part_name)
 
@@ -563,17 +1159,10 @@ def extract_metadata(score) -> dict:
     }
 
 
-def extract_clefs(score) -> dict:
-    """Extract and count clefs from the score."""
-    from music21 import clef
-
-    clef_count = 0
-    clef_types = set()
-
-    for part in score.parts:
-        for c in part.recurse().getElementsByClass(clef.Clef):
-            clef_count += 1
-            clef_types.add(c.sign if hasattr(c, 'sign') else str(type(c).__name__))
+def extract_clefs(clef_signs: list) -> dict:
+    """Count clefs found in the score."""
+    clef_count = len(clef_signs)
+    clef_types = {sign for sign in clef_signs if sign}
 
     # Confidence based on presence of clefs
     confidence = 98 if clef_count > 0 else 0
@@ -585,17 +1174,13 @@ def extract_clefs(score) -> dict:
     }
 
 
-def extract_time_signatures(score) -> dict:
-    """Extract time signatures from the score."""
-    from music21 import meter
-
+def extract_time_signatures(time_signatures: list) -> dict:
+    """Collect the distinct time signatures found in the score."""
     time_sigs = []
 
-    for part in score.parts:
-        for ts in part.recurse().getElementsByClass(meter.TimeSignature):
-            ts_str = ts.ratioString
-            if ts_str not in time_sigs:
-                time_sigs.append(ts_str)
+    for ts_str in time_signatures:
+        if ts_str not in time_sigs:
+            time_sigs.append(ts_str)
 
     # Confidence based on presence of time signatures
     confidence = 95 if time_sigs else 0
@@ -606,22 +1191,21 @@ def extract_time_signatures(score) -> dict:
     }
 
 
-def extract_tempos(score) -> dict:
-    """Extract tempo markings from the score."""
-    from music21 import tempo
-
+def extract_tempos(tempo_marks: list) -> dict:
+    """Collect tempo markings found in the score from (text, bpm) pairs."""
     tempos = []
 
-    for el in score.recurse().getElementsByClass(tempo.MetronomeMark):
-        if el.text:
-            tempos.append(el.text)
-        elif el.number:
-            tempos.append(f"♩={int(el.number)}")
-
-    for el in score.recurse().getElementsByClass(tempo.TempoIndication):
-        if hasattr(el, 'text') and el.text:
-            if el.text not in tempos:
-                tempos.append(el.text)
+    for text, bpm in tempo_marks:
+        if text and text.strip():
+            label = text.strip()
+        else:
+            try:
+                label = f"♩={int(float(bpm))}"
+            except ValueError:
+                label = f"♩={bpm}"
+        # Parts usually repeat the same marking - list each one once
+        if label not in tempos:
+            tempos.append(label)
 
     # Confidence based on presence of tempos
     confidence = 90 if tempos else 50  # Some scores don't have tempo markings
@@ -632,19 +1216,8 @@ def extract_tempos(score) -> dict:
     }
 
 
-def extract_notes(score) -> dict:
-    """Count notes and calculate confidence for note extraction."""
-    from music21 import note
-
-    note_count = 0
-    rest_count = 0
-
-    for n in score.recurse().getElementsByClass(note.Note):
-        note_count += 1
-
-    for r in score.recurse().getElementsByClass(note.Rest):
-        rest_count += 1
-
+def extract_notes(note_count: int, rest_count: int) -> dict:
+    """Calculate confidence for note extraction from the note and rest counts."""
     # Confidence is based on whether we found notes
     # Higher confidence for more notes (indicates successful OMR)
     if note_count > 100:
@@ -673,6 +1246,15 @@ async def health_check():
     }
 
 if __name__ == "__main__":
+    # Needed for the validation process pool in the PyInstaller bundle
+    import multiprocessing
+    multiprocessing.freeze_support()
+
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        # Multiple workers need an import string so each process can load the app
+        uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
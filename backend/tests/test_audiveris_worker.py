@@ -0,0 +1,193 @@
+# Tests for AudiverisWorker, driven by a fake Audiveris CLI
+
+import asyncio
+import shutil
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import main  # noqa: E402
+
+# Stands in for Audiveris: each input PDF holds a behaviour word, and
+# "succeeding" PDFs are exported as <stem>/<stem>.mxl holding that text
+FAKE_AUDIVERIS = """#!{python}
+import sys, time
+from pathlib import Path
+
+args = sys.argv[1:]
+out = Path(args[args.index("-output") + 1])
+pdfs = [Path(a) for a in args if a.endswith(".pdf")]
+with open(Path(__file__).with_name("calls.log"), "a") as log:
+    log.write(f"{{len(pdfs)}}\\n")
+
+status = 0
+for pdf in pdfs:
+    text = pdf.read_text()
+    behaviour = text.split()[0]
+    if behaviour == "hang":
+        time.sleep(60)
+    elif behaviour == "slow":
+        time.sleep(0.5)
+    elif behaviour == "fail":
+        status = 1
+        continue
+    (out / pdf.stem).mkdir()
+    (out / pdf.stem / f"{{pdf.stem}}.mxl").write_text(text)
+    (out / f"{{pdf.stem}}.log").write_text("done")
+sys.exit(status)
+"""
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    script = tmp_path / "audiveris"
+    script.write_text(FAKE_AUDIVERIS.format(python=sys.executable))
+    script.chmod(0o755)
+    monkeypatch.chdir(tmp_path)
+    main.UPLOAD_DIR.mkdir()
+    monkeypatch.setattr(main, "AUDIVERIS_PATH", str(script))
+    return tmp_path
+
+
+def make_job(workdir: Path, filename: str, text: str):
+    """Lay out an upload the way /convert does: its own dir with the PDF in it."""
+    job_dir = workdir / uuid.uuid4().hex
+    job_dir.mkdir()
+    pdf_path = job_dir / filename
+    pdf_path.write_text(text)
+    return pdf_path, job_dir
+
+
+def run_sizes(workdir: Path) -> list:
+    return [int(n) for n in (workdir / "calls.log").read_text().split()]
+
+
+def test_batched_jobs_get_only_their_own_outputs(workdir):
+    blocker = make_job(workdir, "blocker.pdf", "slow")
+    score = make_job(workdir, "score.pdf", "ok score")
+    etude = make_job(workdir, "etude.pdf", "ok etude")
+
+    async def scenario():
+        worker = main.AudiverisWorker(max_concurrent=1)
+        first = asyncio.create_task(worker.submit(*blocker))
+        await asyncio.sleep(0.1)
+        await asyncio.gather(worker.submit(*score), worker.submit(*etude))
+        await first
+
+    asyncio.run(scenario())
+
+    assert run_sizes(workdir) == [1, 2]
+    assert (score[1] / "score" / "score.mxl").read_text() == "ok score"
+    assert (score[1] / "score.log").exists()
+    assert (etude[1] / "etude" / "etude.mxl").read_text() == "ok etude"
+    assert sorted(p.name for p in score[1].iterdir()) == ["score", "score.log", "score.pdf"]
+
+
+@pytest.mark.parametrize("names", [
+    ("score.pdf", "score.v2.pdf"),
+    ("score.v2.pdf", "score.pdf"),
+    ("score.pdf", "score.pdf"),
+])
+def test_clashing_stems_never_share_a_run(workdir, names):
+    blocker = make_job(workdir, "blocker.pdf", "slow")
+    jobs = [make_job(workdir, name, f"ok {i}") for i, name in enumerate(names)]
+
+    async def scenario():
+        worker = main.AudiverisWorker(max_concurrent=1)
+        first = asyncio.create_task(worker.submit(*blocker))
+        await asyncio.sleep(0.1)
+        await asyncio.gather(*(worker.submit(*job) for job in jobs))
+        await first
+
+    asyncio.run(scenario())
+
+    assert run_sizes(workdir) == [1, 1, 1]
+    for i, (pdf_path, output_dir) in enumerate(jobs):
+        stem = pdf_path.stem
+        assert (output_dir / stem / f"{stem}.mxl").read_text() == f"ok {i}"
+        assert sorted(p.name for p in output_dir.iterdir()) == [stem, f"{stem}.log", pdf_path.name]
+
+
+def test_batches_run_concurrently(workdir):
+    jobs = [make_job(workdir, f"score{i}.pdf", "slow") for i in range(2)]
+
+    async def scenario():
+        worker = main.AudiverisWorker(max_concurrent=2)
+        await asyncio.gather(*(worker.submit(*job) for job in jobs))
+
+    start = time.monotonic()
+    asyncio.run(scenario())
+
+    assert run_sizes(workdir) == [1, 1]
+    assert time.monotonic() - start < 0.9
+
+
+def test_failing_pdf_only_fails_its_own_request(workdir):
+    blocker = make_job(workdir, "blocker.pdf", "slow")
+    bad = make_job(workdir, "bad.pdf", "fail")
+    good = make_job(workdir, "good.pdf", "ok good")
+
+    async def scenario():
+        worker = main.AudiverisWorker(max_concurrent=1)
+        first = asyncio.create_task(worker.submit(*blocker))
+        await asyncio.sleep(0.1)
+        results = await asyncio.gather(worker.submit(*bad), worker.submit(*good), return_exceptions=True)
+        await first
+        return results
+
+    bad_result, good_result = asyncio.run(scenario())
+
+    assert isinstance(bad_result, RuntimeError)
+    assert good_result is None
+    assert (good[1] / "good" / "good.mxl").read_text() == "ok good"
+    assert run_sizes(workdir) == [1, 2, 1]
+
+
+def test_hung_pdf_only_fails_its_own_request(workdir):
+    blocker = make_job(workdir, "blocker.pdf", "slow")
+    hung = make_job(workdir, "hung.pdf", "hang")
+    good = make_job(workdir, "good.pdf", "ok good")
+
+    async def scenario():
+        worker = main.AudiverisWorker(max_concurrent=1)
+        worker.timeout_per_pdf = 1
+        first = asyncio.create_task(worker.submit(*blocker))
+        await asyncio.sleep(0.1)
+        results = await asyncio.gather(worker.submit(*hung), worker.submit(*good), return_exceptions=True)
+        await first
+        return results
+
+    hung_result, good_result = asyncio.run(scenario())
+
+    assert isinstance(hung_result, RuntimeError)
+    assert "timed out (1 seconds)" in str(hung_result)
+    assert good_result is None
+    assert (good[1] / "good" / "good.mxl").read_text() == "ok good"
+
+
+def test_request_cancelled_while_queued_does_not_fail_its_batch(workdir):
+    blocker = make_job(workdir, "blocker.pdf", "slow")
+    cancelled = make_job(workdir, "cancelled.pdf", "ok cancelled")
+    good = make_job(workdir, "good.pdf", "ok good")
+
+    async def scenario():
+        worker = main.AudiverisWorker(max_concurrent=1)
+        first = asyncio.create_task(worker.submit(*blocker))
+        await asyncio.sleep(0.1)
+        doomed = asyncio.create_task(worker.submit(*cancelled))
+        kept = asyncio.create_task(worker.submit(*good))
+        await asyncio.sleep(0.1)
+        # What /convert does when its request goes away: cancel, then clean up
+        doomed.cancel()
+        shutil.rmtree(cancelled[1])
+        await first
+        await kept
+
+    asyncio.run(scenario())
+
+    assert (good[1] / "good" / "good.mxl").read_text() == "ok good"
+    assert run_sizes(workdir) == [1, 1]
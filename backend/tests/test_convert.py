@@ -0,0 +1,115 @@
+# End-to-end tests for /convert, with a fake Audiveris CLI
+
+import concurrent.futures
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import main  # noqa: E402
+
+# Exports every input PDF as <stem>/<stem>.musicxml, titled after the PDF's
+# name as Audiveris does, and counts its runs
+FAKE_AUDIVERIS = """#!{python}
+import concurrent.futures
+import sys
+from pathlib import Path
+
+args = sys.argv[1:]
+out = Path(args[args.index("-output") + 1])
+with open(Path(__file__).with_name("calls.log"), "a") as log:
+    log.write("run\\n")
+for pdf in (Path(a) for a in args if a.endswith(".pdf")):
+    (out / pdf.stem).mkdir()
+    (out / pdf.stem / f"{{pdf.stem}}.musicxml").write_text(f'''<?xml version="1.0"?>
+<score-partwise>
+  <work><work-title>{{pdf.stem}}</work-title></work>
+  <part-list><score-part id="P1"><part-name>Piano</part-name></score-part></part-list>
+  <part id="P1"><measure number="1">
+    <attributes><time><beats>4</beats><beat-type>4</beat-type></time><clef><sign>G</sign></clef></attributes>
+    <note><pitch><step>C</step><octave>4</octave></pitch></note>
+    <note><rest/></note>
+  </measure></part>
+</score-partwise>''')
+"""
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    script = tmp_path / "audiveris"
+    script.write_text(FAKE_AUDIVERIS.format(python=sys.executable))
+    script.chmod(0o755)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "AUDIVERIS_PATH", str(script))
+    monkeypatch.setattr(main, "validation_cache", main.ValidationCache(tmp_path / "validation_cache.jsonl"))
+    # App shutdown closes the pool, so each app run needs a fresh one
+    monkeypatch.setattr(main, "_val_pool", concurrent.futures.ProcessPoolExecutor(max_workers=1))
+    with TestClient(main.app) as client:
+        yield client
+
+
+def convert(client, filename: str, content: bytes = b"%PDF-1.4 score"):
+    response = client.post(
+        "/convert",
+        files={"file": (filename, content, "application/pdf")},
+        data={"engine": "audiveris"},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def audiveris_runs(client) -> int:
+    return len(Path("calls.log").read_text().splitlines())
+
+
+def test_convert_reports_on_the_exported_score(client):
+    result = convert(client, "study.pdf")
+
+    assert result["success"] is True
+    assert result["filename"] == "study.musicxml"
+    assert result["validation"]["metadata"]["title"] == "study"
+    assert result["validation"]["notes"] == {"count": 1, "rests": 1, "confidence": 60}
+
+    download = client.get(result["download_url"])
+    assert download.status_code == 200
+    assert "<work-title>study</work-title>" in download.text
+
+
+def test_identical_upload_reuses_conversion(client):
+    first = convert(client, "study.pdf")
+    second = convert(client, "study.pdf")
+
+    assert audiveris_runs(client) == 1
+    assert second["download_url"] != first["download_url"]
+    assert second["validation"]["notes"] == first["validation"]["notes"]
+
+
+def test_same_bytes_under_another_name_are_converted_again(client):
+    convert(client, "study.pdf")
+    convert(client, "someone-else.pdf")
+
+    assert audiveris_runs(client) == 2
+
+
+def test_concurrent_store_keeps_first_file_and_report_together(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    main.BY_HASH_DIR.mkdir(parents=True)
+    first, second = tmp_path / "first.musicxml", tmp_path / "second.musicxml"
+    first.write_text("first")
+    second.write_text("second")
+
+    main.store_converted_upload("key", first, {"n": 1})
+    main.store_converted_upload("key", second, {"n": 2})
+
+    musicxml_path, report = main.load_converted_upload("key")
+    assert musicxml_path.read_text() == "first"
+    assert report == {"n": 1}
+
+
+def test_exported_title_comes_from_the_uploaded_name(client):
+    result = convert(client, "score.v2.pdf")
+
+    assert result["validation"]["metadata"]["title"] == "score.v2"
+    assert "<work-title>score.v2</work-title>" in client.get(result["download_url"]).text
@@ -0,0 +1,60 @@
+# Tests for process_pdf_with_homr's handling of the pdfium document
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+pdfium = pytest.importorskip("pypdfium2")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import main  # noqa: E402
+
+
+def test_cancel_closes_pdf_only_after_running_renders(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "score.pdf"
+    doc = pdfium.PdfDocument.new()
+    for _ in range(4):
+        doc.new_page(595, 842)
+    doc.save(str(pdf_path))
+    doc.close()
+
+    events = []
+    lock = threading.Lock()
+    real_render = main.render_pdf_page
+    real_close = pdfium.PdfDocument.close
+
+    def slow_render(pdf, index, img_path):
+        with lock:
+            events.append("render")
+        time.sleep(0.3)
+        real_render(pdf, index, img_path)
+        with lock:
+            events.append("rendered")
+
+    def recording_close(pdf):
+        with lock:
+            events.append("close")
+        real_close(pdf)
+
+    monkeypatch.setattr(main, "render_pdf_page", slow_render)
+    monkeypatch.setattr(pdfium.PdfDocument, "close", recording_close)
+
+    async def scenario():
+        task = asyncio.create_task(main.process_pdf_with_homr(pdf_path, tmp_path))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    deadline = time.monotonic() + 5
+    while "close" not in events and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert events.count("render") >= 1
+    assert events.count("rendered") == events.count("render")
+    assert events.index("close") > max(i for i, e in enumerate(events) if e == "rendered")
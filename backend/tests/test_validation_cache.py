@@ -0,0 +1,69 @@
+# Tests for ValidationCache and what /download will serve
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import main  # noqa: E402
+
+
+def test_cache_survives_restart_and_stays_bounded(tmp_path):
+    path = tmp_path / "validation_cache.jsonl"
+
+    async def fill():
+        cache = main.ValidationCache(path, max_entries=3)
+        for i in range(10):
+            await cache.put(f"key{i}", {"overallConfidence": i})
+        await cache.put("failed", {"error": "boom"})
+        return cache
+
+    cache = asyncio.run(fill())
+    assert list(cache._entries) == ["key7", "key8", "key9"]
+    # Appends are compacted away once they reach twice max_entries
+    assert len(path.read_text().splitlines()) <= 6
+
+    reloaded = main.ValidationCache(path, max_entries=3)
+    assert list(reloaded._entries) == ["key7", "key8", "key9"]
+    assert reloaded.get("key8", 1.234) == {"overallConfidence": 8, "processingTime": 1.23}
+    assert reloaded.get("key0", 1.0) is None
+    assert reloaded.get("failed", 1.0) is None
+
+
+def test_cache_skips_torn_lines(tmp_path):
+    path = tmp_path / "validation_cache.jsonl"
+    path.write_text('{"key": "a", "report": {"n": 1}}\n{"key": "b", "rep')
+
+    assert main.ValidationCache(path).get("a", 0) == {"n": 1, "processingTime": 0}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("filename", [
+    ".validation_cache.json",
+    ".hidden.musicxml",
+    "notes.txt",
+    "by-hash",
+])
+def test_download_refuses_anything_but_converted_scores(client, filename):
+    (main.OUTPUT_DIR / filename).touch()
+
+    assert client.get(f"/download/{filename}").status_code == 404
+
+
+def test_download_serves_converted_scores(client):
+    (main.OUTPUT_DIR / "abc123_score.musicxml").write_text("<score-partwise/>")
+
+    response = client.get("/download/abc123_score.musicxml")
+
+    assert response.status_code == 200
+    assert response.text == "<score-partwise/>"
+    assert 'filename="score.musicxml"' in response.headers["content-disposition"]
@@ -0,0 +1,41 @@
+# Tests for generate_validation_report's streaming MusicXML pass
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import main  # noqa: E402
+
+SCORE = """<?xml version="1.0"?>
+<score-partwise>
+  <part-list><score-part id="P1"><part-name>Violin</part-name></score-part></part-list>
+  <part id="P1">
+    <measure number="1">
+      <direction><direction-type><words>Allegro</words></direction-type><sound tempo="132"/></direction>
+      <note><pitch><step>C</step><octave>4</octave></pitch></note>
+      <note><pitch><step>E</step><octave>4</octave></pitch></note>
+      <note><chord/><pitch><step>G</step><octave>4</octave></pitch></note>
+      <forward><duration>1</duration></forward>
+      <note><rest/></note>
+    </measure>
+    <measure number="2">
+      <sound tempo="60"/>
+      <note><rest measure="yes"/></note>
+    </measure>
+  </part>
+</score-partwise>
+"""
+
+
+def test_report_counts_and_tempos(tmp_path):
+    path = tmp_path / "score.musicxml"
+    path.write_text(SCORE)
+
+    report = main.generate_validation_report(str(path), 0.5)
+
+    assert report["metadata"]["instruments"] == ["Violin"]
+    # The chord counts once; <forward> is a spacer, not a rest
+    assert report["notes"]["count"] == 2
+    assert report["notes"]["rests"] == 2
+    # Measure-level <sound> is read; the one inside <direction> isn't doubled
+    assert report["tempos"]["detected"] == ["Allegro", "♩=60"]